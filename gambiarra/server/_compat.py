@@ -0,0 +1,9 @@
+"""
+Python version compatibility helpers for the Gambiarra server.
+"""
+
+import sys
+from typing import Any, Dict
+
+# dataclass(slots=True) needs Python 3.10; older interpreters get regular instances
+DATACLASS_SLOTS: Dict[str, Any] = {"slots": True} if sys.version_info >= (3, 10) else {}
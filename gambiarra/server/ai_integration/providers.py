@@ -7,7 +7,8 @@ import asyncio
 import json
 import logging
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, AsyncIterator, Optional
+from types import TracebackType
+from typing import Dict, List, Any, AsyncIterator, Optional, Type
 import aiohttp
 
 # Import TrustGraph API
@@ -17,8 +18,73 @@ try:
 except ImportError:
     TRUSTGRAPH_AVAILABLE = False
 
+# Optional faster JSON codec for request payloads and streamed chunks
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+if ORJSON_AVAILABLE:
+    def _json_dumps(obj: Any) -> str:
+        """Serialize a request payload to JSON text with orjson."""
+        return orjson.dumps(obj).decode("utf-8")
+
+    def _json_loads(data: str) -> Any:
+        """Parse JSON text with orjson.
+
+        orjson.JSONDecodeError subclasses json.JSONDecodeError, so handlers stay unchanged.
+        """
+        return orjson.loads(data)
+else:
+    def _json_dumps(obj: Any) -> str:
+        """Serialize a request payload to JSON text."""
+        return json.dumps(obj)
+
+    def _json_loads(data: str) -> Any:
+        """Parse JSON text."""
+        return json.loads(data)
+
+
+def _create_pooled_session() -> aiohttp.ClientSession:
+    """Create an HTTP session backed by a keep-alive connection pool."""
+    connector = aiohttp.TCPConnector(
+        limit=100,
+        limit_per_host=32,
+        keepalive_timeout=75
+    )
+    return aiohttp.ClientSession(connector=connector, json_serialize=_json_dumps)
+
+
+# Longest line accepted from a stream, matching aiohttp's default readline limit
+_MAX_LINE_SIZE = 2 ** 17
+
+
+async def _iter_lines(content: aiohttp.StreamReader) -> AsyncIterator[bytes]:
+    """Yield newline-delimited lines from a response body read in whole chunks."""
+    buffer = bytearray()
+    async for data, _ in content.iter_chunks():
+        # Only the new chunk is scanned; the buffer holds just the unfinished line
+        start = 0
+        end = data.find(b"\n")
+        while end != -1:
+            buffer += data[start:end]
+            if len(buffer) > _MAX_LINE_SIZE:
+                raise ValueError(f"Line is too long (over {_MAX_LINE_SIZE} bytes)")
+            yield bytes(buffer)
+            buffer.clear()
+            start = end + 1
+            end = data.find(b"\n", start)
+
+        buffer += data[start:]
+        if len(buffer) > _MAX_LINE_SIZE:
+            raise ValueError(f"Line is too long (over {_MAX_LINE_SIZE} bytes)")
+
+    if buffer:
+        yield bytes(buffer)
+
 
 class AIProvider(ABC):
     """Abstract base class for AI providers."""
@@ -38,6 +104,21 @@ class AIProvider(ABC):
         """Check provider health."""
         pass
 
+    async def close(self) -> None:
+        """Release provider resources."""
+        pass
+
+    async def __aenter__(self) -> "AIProvider":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc: Optional[BaseException],
+        tb: Optional[TracebackType],
+    ) -> None:
+        await self.close()
+
 
 class DummyAIProvider(AIProvider):
     """Dummy AI provider for testing that connects to our test server."""
@@ -47,9 +128,9 @@ class DummyAIProvider(AIProvider):
         self.session = None
 
     async def _get_session(self) -> aiohttp.ClientSession:
-        """Get or create HTTP session."""
+        """Get or create the pooled HTTP session reused across requests."""
         if not self.session:
-            self.session = aiohttp.ClientSession()
+            self.session = _create_pooled_session()
         return self.session
 
     async def stream_completion(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
@@ -78,7 +159,7 @@ class DummyAIProvider(AIProvider):
                     error_text = await response.text()
                     raise Exception(f"AI provider error {response.status}: {error_text}")
 
-                async for line in response.content:
+                async for line in _iter_lines(response.content):
                     line_str = line.decode('utf-8').strip()
 
                     if not line_str:
@@ -91,7 +172,7 @@ class DummyAIProvider(AIProvider):
                             break
 
                         try:
-                            data = json.loads(data_str)
+                            data = _json_loads(data_str)
                             choices = data.get("choices", [])
 
                             if choices and "delta" in choices[0]:
@@ -138,6 +219,7 @@ class DummyAIProvider(AIProvider):
         """Close HTTP session."""
         if self.session:
             await self.session.close()
+            self.session = None
 
 
 class OpenAIProvider(AIProvider):
@@ -148,9 +230,9 @@ class OpenAIProvider(AIProvider):
         self.session = None
 
     async def _get_session(self) -> aiohttp.ClientSession:
-        """Get or create HTTP session."""
+        """Get or create the pooled HTTP session reused across requests."""
         if not self.session:
-            self.session = aiohttp.ClientSession()
+            self.session = _create_pooled_session()
         return self.session
 
     async def stream_completion(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
@@ -179,7 +261,7 @@ class OpenAIProvider(AIProvider):
                     error_text = await response.text()
                     raise Exception(f"OpenAI API error {response.status}: {error_text}")
 
-                async for line in response.content:
+                async for line in _iter_lines(response.content):
                     line_str = line.decode('utf-8').strip()
 
                     if not line_str or not line_str.startswith("data: "):
@@ -191,7 +273,7 @@ class OpenAIProvider(AIProvider):
                         break
 
                     try:
-                        data = json.loads(data_str)
+                        data = _json_loads(data_str)
                         choices = data.get("choices", [])
 
                         if choices and "delta" in choices[0]:
@@ -238,6 +320,7 @@ class OpenAIProvider(AIProvider):
         """Close HTTP session."""
         if self.session:
             await self.session.close()
+            self.session = None
 
 
 class TrustGraphProvider(AIProvider):
@@ -249,9 +332,9 @@ class TrustGraphProvider(AIProvider):
         self.flow_id = model  # Use model as flow ID for TrustGraph
 
     async def _get_session(self) -> aiohttp.ClientSession:
-        """Get or create HTTP session."""
+        """Get or create the pooled HTTP session reused across requests."""
         if not self.session:
-            self.session = aiohttp.ClientSession()
+            self.session = _create_pooled_session()
         return self.session
 
     async def stream_completion(self, messages: List[Dict[str, str]]) -> AsyncIterator[str]:
@@ -327,6 +410,7 @@ class TrustGraphProvider(AIProvider):
         """Close HTTP session."""
         if self.session:
             await self.session.close()
+            self.session = None
 
 
 class AIProviderManager:
@@ -335,9 +419,13 @@ class AIProviderManager:
     def __init__(self, default_provider: str = "test"):
         self.providers: Dict[str, AIProvider] = {}
         self.default_provider = default_provider
+        self._initialized = False
 
     async def initialize(self, openai_api_key: str = None, trustgraph_url: str = None, trustgraph_flow: str = None):
-        """Initialize AI providers."""
+        """Initialize AI providers. Repeated calls are no-ops."""
+        if self._initialized:
+            return
+
         # Initialize test provider (always available)
         self.providers["test"] = DummyAIProvider()
 
@@ -355,6 +443,7 @@ class AIProviderManager:
         )
         logger.info(f"✅ TrustGraph provider initialized (URL: {trustgraph_url}, flow: {flow_id})")
 
+        self._initialized = True
         logger.info(f"✅ AI providers initialized: {list(self.providers.keys())}")
 
     def add_provider(self, name: str, provider: AIProvider):
@@ -365,30 +454,38 @@ class AIProviderManager:
     def get_provider(self, name: str = None) -> AIProvider:
         """Get AI provider by name."""
         provider_name = name or self.default_provider
+        provider = self.providers.get(provider_name)
 
-        if provider_name not in self.providers:
+        if provider is None:
             logger.warning(f"❌ Provider {provider_name} not found, using {self.default_provider}")
-            provider_name = self.default_provider
+            provider = self.providers[self.default_provider]
 
-        return self.providers[provider_name]
+        return provider
 
     def available_providers(self) -> List[str]:
         """Get list of available providers."""
         return list(self.providers.keys())
 
     async def health_check(self) -> Dict[str, Any]:
-        """Check health of all providers."""
-        health_results = {}
+        """Check health of all providers concurrently."""
+        names = list(self.providers)
+        results = await asyncio.gather(
+            *(provider.health_check() for provider in self.providers.values()),
+            return_exceptions=True
+        )
 
-        for name, provider in self.providers.items():
-            try:
-                health_results[name] = await provider.health_check()
-            except Exception as e:
+        health_results = {}
+        for name, result in zip(names, results):
+            if isinstance(result, BaseException):
+                if not isinstance(result, Exception):
+                    raise result  # Cancellation and exits aren't provider errors
                 health_results[name] = {
                     "status": "error",
                     "provider": name,
-                    "error": str(e)
+                    "error": str(result)
                 }
+            else:
+                health_results[name] = result
 
         return health_results
 
@@ -4,8 +4,140 @@ Handles both flat and nested XML structures according to server/prompts/tools.py
 """
 
 import re
-import html
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Callable, Pattern, Tuple
+
+
+# The predefined XML entities; tool call values never use the wider HTML set
+_ENT = {"amp": "&", "lt": "<", "gt": ">", "quot": '"', "apos": "'"}
+_ENT_RE = re.compile(r'&(amp|lt|gt|quot|apos|#[0-9]+|#[xX][0-9a-fA-F]+);')
+
+
+def _replace_entity(match: "re.Match[str]") -> str:
+    """Resolve a single entity reference, leaving invalid code points untouched."""
+    name = match.group(1)
+    if name[0] != "#":
+        return _ENT[name]
+    codepoint = int(name[2:], 16) if name[1] in "xX" else int(name[1:])
+    if codepoint == 0 or codepoint > 0x10FFFF or 0xD800 <= codepoint <= 0xDFFF:
+        return match.group(0)
+    return chr(codepoint)
+
+
+def _unescape(content: str) -> str:
+    """Unescape XML entity and character references in content."""
+    if "&" not in content:
+        return content
+    return _ENT_RE.sub(_replace_entity, content)
+
+
+def _unescape_text(content: str) -> str:
+    """Unescape entities in content, trimming surrounding whitespace."""
+    return _unescape(content.strip()) if content else content
+
+
+def _unescape_raw(content: str) -> str:
+    """Unescape entities in content, preserving whitespace."""
+    return _unescape(content) if content else content
+
+
+def _to_bool(value: str) -> bool:
+    """Convert a matched true/false literal to a bool."""
+    return value == "true"
+
+
+def _tag_re(tag: str, value: str = r'(.*?)') -> Pattern[str]:
+    """Compile a pattern capturing the value of a single <tag>...</tag> element."""
+    return re.compile(f'<{tag}>{value}</{tag}>', re.DOTALL)
+
+
+# (parameter name, compiled pattern, converter applied to the captured value)
+ParameterSpec = Tuple[str, Pattern[str], Callable[[str], Any]]
+
+# Tool names recognised as the root element of a nested tool call
+_VALID_TOOLS = frozenset({
+    "read_file", "write_to_file", "list_files", "search_files",
+    "execute_command", "search_and_replace", "insert_content",
+    "list_code_definition_names", "attempt_completion",
+    "ask_followup_question", "update_todo_list"
+})
+
+# Opening tag of any known tool, e.g. "<read_file>" or "<read_file attr=...>"
+_TOOL_RE = re.compile(r'<(' + '|'.join(sorted(_VALID_TOOLS)) + r')[ >]')
+
+# Everything between the outermost <args> and </args> of a nested tool call
+_ARGS_RE = re.compile(r'<args>(.*)</args>', re.DOTALL)
+
+_PATH_PARAM: ParameterSpec = ("path", _tag_re("path"), _unescape_text)
+
+# Parameters extracted from the <args> span of each tool, in output order
+_TOOL_PARAMETERS: Dict[str, Tuple[ParameterSpec, ...]] = {
+    # Nested structure: <read_file><args><file><path>...</path></file></args></read_file>
+    "read_file": (
+        ("path", re.compile(r'<file>.*?<path>(.*?)</path>.*?</file>', re.DOTALL), _unescape_text),
+    ),
+    "write_to_file": (
+        _PATH_PARAM,
+        ("content", _tag_re("content"), _unescape_raw),
+        ("line_count", _tag_re("line_count", r'(\d+)'), int),
+    ),
+    "search_and_replace": (
+        _PATH_PARAM,
+        ("search", _tag_re("search"), _unescape_raw),
+        ("replace", _tag_re("replace"), _unescape_raw),
+    ),
+    "insert_content": (
+        _PATH_PARAM,
+        ("line_number", _tag_re("line_number", r'(\d+)'), int),
+        ("content", _tag_re("content"), _unescape_raw),
+    ),
+    "list_code_definition_names": (
+        _PATH_PARAM,
+    ),
+    "list_files": (
+        _PATH_PARAM,
+        ("recursive", _tag_re("recursive", r'(true|false)'), _to_bool),
+    ),
+    "search_files": (
+        _PATH_PARAM,
+        ("regex", _tag_re("regex"), _unescape_text),
+        ("file_pattern", _tag_re("file_pattern"), _unescape_text),
+    ),
+    "execute_command": (
+        ("command", _tag_re("command"), _unescape_text),
+    ),
+    "ask_followup_question": (
+        ("question", _tag_re("question"), _unescape_raw),
+    ),
+    "attempt_completion": (
+        ("result", _tag_re("result"), _unescape_raw),
+    ),
+    "update_todo_list": (
+        ("todos", _tag_re("todos"), _unescape_raw),
+    ),
+}
+
+
+def _flat_re(tag: str, value: str = r'(.*?)', multiline: bool = False) -> Pattern[str]:
+    """Compile a flat-structure pattern; only free-text fields may span lines."""
+    return re.compile(f'<{tag}>{value}</{tag}>', re.DOTALL if multiline else 0)
+
+
+# Parameters recognised by the legacy flat structure, in output order
+_FLAT_PARAMETERS: Tuple[ParameterSpec, ...] = (
+    ("path", _flat_re("path"), _unescape_text),
+    ("content", _flat_re("content", multiline=True), _unescape_text),
+    ("regex", _flat_re("regex"), _unescape_text),
+    ("command", _flat_re("command"), _unescape_text),
+    ("search", _flat_re("search", multiline=True), _unescape_text),
+    ("replace", _flat_re("replace", multiline=True), _unescape_text),
+    ("line_count", _flat_re("line_count", r'(\d+)'), int),
+    ("line_number", _flat_re("line_number", r'(\d+)'), int),
+    ("recursive", _flat_re("recursive", r'(true|false)'), _to_bool),
+    ("file_pattern", _flat_re("file_pattern"), _unescape_text),
+    ("question", _flat_re("question", multiline=True), _unescape_text),
+    ("result", _flat_re("result", multiline=True), _unescape_text),
+    ("todos", _flat_re("todos", multiline=True), _unescape_text),
+)
 
 
 class ToolCallParser:
@@ -13,160 +145,57 @@ class ToolCallParser:
 
     @staticmethod
     def parse_xml_parameters(xml_content: str) -> Dict[str, Any]:
-        """Parse parameters from XML tool content according to master specification."""
+        """Parse parameters from XML tool content according to master specification.
 
-        def unescape_content(content: str) -> str:
-            """Unescape HTML entities in content."""
-            if content:
-                return html.unescape(content)
-            return content
-
-        params = {}
+        Returns a new dict on every call, owned by the caller; no defensive copy is needed.
+        """
 
         # Determine tool type from root element
         tool_type = ToolCallParser._extract_tool_type(xml_content)
 
         if not tool_type:
             # Fallback to legacy flat parsing for backward compatibility
-            return ToolCallParser._parse_flat_structure(xml_content, unescape_content)
-
-        # Parse according to master specification - all tools now use nested args structure
-        if tool_type == "read_file":
-            # Nested structure: <read_file><args><file><path>...</path></file></args></read_file>
-            path_match = re.search(r'<args>.*?<file>.*?<path>(.*?)</path>.*?</file>.*?</args>', xml_content, re.DOTALL)
-            if path_match:
-                params["path"] = unescape_content(path_match.group(1).strip())
+            return ToolCallParser._parse_flat_structure(xml_content)
 
-        elif tool_type in ["write_to_file", "search_and_replace", "insert_content", "list_code_definition_names", "list_files", "search_files"]:
-            # Nested structure with args wrapper: <tool><args><path>...</path></args></tool>
-            path_match = re.search(r'<args>.*?<path>(.*?)</path>.*?</args>', xml_content, re.DOTALL)
-            if path_match:
-                params["path"] = unescape_content(path_match.group(1).strip())
+        params: Dict[str, Any] = {}
 
-        # Extract tool-specific parameters
-        ToolCallParser._extract_tool_parameters(tool_type, xml_content, params, unescape_content)
+        # All tools use the nested args structure, so locate the <args> span once
+        args_match = _ARGS_RE.search(xml_content)
+        if args_match:
+            ToolCallParser._extract_tool_parameters(tool_type, args_match.group(1), params)
 
         return params
 
     @staticmethod
     def _extract_tool_type(xml_content: str) -> Optional[str]:
-        """Extract tool type from XML content."""
-        tool_types = [
-            "read_file", "write_to_file", "list_files", "search_files",
-            "execute_command", "search_and_replace", "insert_content",
-            "list_code_definition_names", "attempt_completion",
-            "ask_followup_question", "update_todo_list"
-        ]
-
-        for tool in tool_types:
-            if f"<{tool}>" in xml_content or f"<{tool} " in xml_content:
-                return tool
-
-        return None
+        """Extract tool type from the first known tool tag in XML content."""
+        # Fast reject for text that can't contain any tag at all
+        if "<" not in xml_content:
+            return None
+        match = _TOOL_RE.search(xml_content)
+        return match.group(1) if match else None
 
     @staticmethod
-    def _extract_tool_parameters(tool_type: str, xml_content: str, params: Dict[str, Any], unescape_func) -> None:
-        """Extract tool-specific parameters from nested args structure."""
-
-        # All tools now use nested args structure, so search within <args> tags
-        if tool_type == "write_to_file":
-            content_match = re.search(r'<args>.*?<content>(.*?)</content>.*?</args>', xml_content, re.DOTALL)
-            if content_match:
-                params["content"] = unescape_func(content_match.group(1))
-
-            line_count_match = re.search(r'<args>.*?<line_count>(\d+)</line_count>.*?</args>', xml_content, re.DOTALL)
-            if line_count_match:
-                params["line_count"] = int(line_count_match.group(1))
-
-        elif tool_type == "search_files":
-            regex_match = re.search(r'<args>.*?<regex>(.*?)</regex>.*?</args>', xml_content, re.DOTALL)
-            if regex_match:
-                params["regex"] = unescape_func(regex_match.group(1).strip())
-
-            file_pattern_match = re.search(r'<args>.*?<file_pattern>(.*?)</file_pattern>.*?</args>', xml_content, re.DOTALL)
-            if file_pattern_match:
-                params["file_pattern"] = unescape_func(file_pattern_match.group(1).strip())
-
-        elif tool_type == "list_files":
-            recursive_match = re.search(r'<args>.*?<recursive>(true|false)</recursive>.*?</args>', xml_content, re.DOTALL)
-            if recursive_match:
-                params["recursive"] = recursive_match.group(1) == "true"
-
-        elif tool_type == "execute_command":
-            command_match = re.search(r'<args>.*?<command>(.*?)</command>.*?</args>', xml_content, re.DOTALL)
-            if command_match:
-                params["command"] = unescape_func(command_match.group(1).strip())
-
-        elif tool_type == "search_and_replace":
-            search_match = re.search(r'<args>.*?<search>(.*?)</search>.*?</args>', xml_content, re.DOTALL)
-            if search_match:
-                params["search"] = unescape_func(search_match.group(1))
-
-            replace_match = re.search(r'<args>.*?<replace>(.*?)</replace>.*?</args>', xml_content, re.DOTALL)
-            if replace_match:
-                params["replace"] = unescape_func(replace_match.group(1))
-
-        elif tool_type == "insert_content":
-            line_number_match = re.search(r'<args>.*?<line_number>(\d+)</line_number>.*?</args>', xml_content, re.DOTALL)
-            if line_number_match:
-                params["line_number"] = int(line_number_match.group(1))
-
-            content_match = re.search(r'<args>.*?<content>(.*?)</content>.*?</args>', xml_content, re.DOTALL)
-            if content_match:
-                params["content"] = unescape_func(content_match.group(1))
-
-        elif tool_type == "ask_followup_question":
-            question_match = re.search(r'<args>.*?<question>(.*?)</question>.*?</args>', xml_content, re.DOTALL)
-            if question_match:
-                params["question"] = unescape_func(question_match.group(1))
-
-        elif tool_type == "attempt_completion":
-            result_match = re.search(r'<args>.*?<result>(.*?)</result>.*?</args>', xml_content, re.DOTALL)
-            if result_match:
-                params["result"] = unescape_func(result_match.group(1))
-
-        elif tool_type == "update_todo_list":
-            todos_match = re.search(r'<args>.*?<todos>(.*?)</todos>.*?</args>', xml_content, re.DOTALL)
-            if todos_match:
-                params["todos"] = unescape_func(todos_match.group(1))
+    def _extract_tool_parameters(tool_type: str, args_content: str, params: Dict[str, Any]) -> None:
+        """Extract tool-specific parameters from the content of the <args> element."""
+        for name, pattern, convert in _TOOL_PARAMETERS.get(tool_type, ()):
+            match = pattern.search(args_content)
+            if match:
+                params[name] = convert(match.group(1))
 
     @staticmethod
-    def _parse_flat_structure(xml_content: str, unescape_func) -> Dict[str, Any]:
+    def _parse_flat_structure(xml_content: str) -> Dict[str, Any]:
         """Fallback parsing for flat XML structure (legacy compatibility)."""
-        params = {}
-
-        # Extract common parameters using flat structure
-        patterns = {
-            "path": r'<path>(.*?)</path>',
-            "content": r'<content>(.*?)</content>',
-            "regex": r'<regex>(.*?)</regex>',
-            "command": r'<command>(.*?)</command>',
-            "search": r'<search>(.*?)</search>',
-            "replace": r'<replace>(.*?)</replace>',
-            "line_count": r'<line_count>(\d+)</line_count>',
-            "line_number": r'<line_number>(\d+)</line_number>',
-            "recursive": r'<recursive>(true|false)</recursive>',
-            "file_pattern": r'<file_pattern>(.*?)</file_pattern>',
-            "question": r'<question>(.*?)</question>',
-            "result": r'<result>(.*?)</result>',
-            "todos": r'<todos>(.*?)</todos>'
-        }
-
-        for param_name, pattern in patterns.items():
-            flags = re.DOTALL if param_name in ["content", "search", "replace", "question", "result", "todos"] else 0
-            match = re.search(pattern, xml_content, flags)
+        params: Dict[str, Any] = {}
+
+        for name, pattern, convert in _FLAT_PARAMETERS:
+            match = pattern.search(xml_content)
             if match:
-                value = match.group(1)
-                if param_name in ["line_number", "line_count"]:
-                    params[param_name] = int(value)
-                elif param_name == "recursive":
-                    params[param_name] = value == "true"
-                else:
-                    params[param_name] = unescape_func(value.strip() if value else "")
+                params[name] = convert(match.group(1))
 
         return params
 
 
 def parse_xml_parameters(xml_content: str) -> Dict[str, Any]:
     """Legacy function for backward compatibility."""
-    return ToolCallParser.parse_xml_parameters(xml_content)
\ No newline at end of file
+    return ToolCallParser.parse_xml_parameters(xml_content)
@@ -3,10 +3,12 @@ Tool registry for dynamic tool management.
 Provides comprehensive tool registry and validation.
 """
 
-from typing import Dict, List, Any, Optional
+from typing import Dict, Any, Optional, Sequence, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
+from gambiarra.server._compat import DATACLASS_SLOTS
+
 
 class ToolRiskLevel(Enum):
     """Tool risk levels for approval workflows."""
@@ -15,7 +17,7 @@ class ToolRiskLevel(Enum):
     HIGH = "high"
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class ToolDefinition:
     """Definition of a tool and its capabilities."""
     name: str
@@ -36,6 +38,8 @@ class ToolRegistry:
 
     def __init__(self):
         self._tools: Dict[str, ToolDefinition] = {}
+        # Tool names in registration order, rebuilt lazily after register/unregister
+        self._tool_names: Optional[Tuple[str, ...]] = None
         self._initialize_default_tools()
 
     def _initialize_default_tools(self) -> None:
@@ -177,16 +181,26 @@ class ToolRegistry:
     def register_tool(self, tool: ToolDefinition) -> None:
         """Register a new tool in the registry."""
         self._tools[tool.name] = tool
+        self._tool_names = None
+
+    def unregister_tool(self, name: str) -> bool:
+        """Remove a tool from the registry, returning whether it was registered."""
+        if self._tools.pop(name, None) is None:
+            return False
+        self._tool_names = None
+        return True
 
     def get_tool(self, name: str) -> Optional[ToolDefinition]:
         """Get tool definition by name."""
         return self._tools.get(name)
 
-    def list_tools(self) -> List[str]:
-        """Get list of all registered tool names."""
-        return list(self._tools.keys())
+    def list_tools(self) -> Sequence[str]:
+        """Get all registered tool names (an immutable snapshot, reused until the registry changes)."""
+        if self._tool_names is None:
+            self._tool_names = tuple(self._tools)
+        return self._tool_names
 
-    def get_available_tools(self) -> List[str]:
+    def get_available_tools(self) -> Sequence[str]:
         """Get list of available tool names (alias for compatibility)."""
         return self.list_tools()
 
@@ -7,8 +7,25 @@ import re
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
 
+from .parser import ToolCallParser
 from .registry import get_tool_registry, ToolValidationError
 
+# Patterns used on every validation, compiled once at import
+_OPENING_TAG_RE = re.compile(r'<(\w+)(?:\s|>)')
+_READ_FILE_STRUCTURE_RE = re.compile(r'<args>.*<file>.*<path>.*</path>.*</file>.*</args>', re.DOTALL)
+_PARAM_VALUE_RE = re.compile(r'<(\w+)>\s*(.*?)\s*</\1>', re.DOTALL)
+_ESCAPED_ENTITY_RE = re.compile(r'&(?:amp|lt|gt|quot|apos);')
+_RECURSIVE_VALUE_RE = re.compile(r'<recursive>(.*?)</recursive>')
+_INTER_TAG_WHITESPACE_RE = re.compile(r'>\s+<')
+_ELEMENT_VALUE_RE = re.compile(r'<(\w+)>.*?</\1>')
+
+# Tools other than read_file whose calls only need an <args> element
+_ARGS_TOOLS = frozenset({
+    "write_to_file", "list_files", "search_files", "execute_command",
+    "search_and_replace", "insert_content", "list_code_definition_names",
+    "attempt_completion", "ask_followup_question", "update_todo_list"
+})
+
 
 @dataclass
 class ValidationResult:
@@ -54,7 +71,6 @@ class XMLFormatValidator:
 
         # Parse parameters
         try:
-            from .parser import ToolCallParser
             parsed_params = ToolCallParser.parse_xml_parameters(xml_content)
 
             # Validate parameters against tool definition
@@ -82,10 +98,10 @@ class XMLFormatValidator:
     def _extract_tool_name(self, xml_content: str) -> Optional[str]:
         """Extract tool name from XML content."""
         # Look for opening tag
-        match = re.search(r'<(\w+)(?:\s|>)', xml_content)
+        match = _OPENING_TAG_RE.search(xml_content)
         if match:
             potential_tool = match.group(1)
-            if potential_tool in self.registry.list_tools():
+            if self.registry.get_tool(potential_tool) is not None:
                 return potential_tool
 
         return None
@@ -105,12 +121,10 @@ class XMLFormatValidator:
                 errors.append("read_file missing <args> element")
             elif "<file>" not in xml_content:
                 errors.append("read_file missing <file> element within <args>")
-            elif not re.search(r'<args>.*<file>.*<path>.*</path>.*</file>.*</args>', xml_content, re.DOTALL):
+            elif not _READ_FILE_STRUCTURE_RE.search(xml_content):
                 errors.append("read_file has incorrect nested structure")
 
-        elif tool_name in ["write_to_file", "list_files", "search_files", "execute_command",
-                          "search_and_replace", "insert_content", "list_code_definition_names",
-                          "attempt_completion", "ask_followup_question", "update_todo_list"]:
+        elif tool_name in _ARGS_TOOLS:
             # All tools now require nested args structure
             if "<args>" not in xml_content:
                 errors.append(f"{tool_name} missing <args> element")
@@ -133,17 +147,17 @@ class XMLFormatValidator:
         warnings = []
 
         # Check for extra whitespace in parameter values
-        param_matches = re.findall(r'<(\w+)>\s*(.*?)\s*</\1>', xml_content, re.DOTALL)
+        param_matches = _PARAM_VALUE_RE.findall(xml_content)
         for param_name, param_value in param_matches:
             if param_value != param_value.strip():
                 warnings.append(f"Parameter '{param_name}' has extra whitespace")
 
         # Check for HTML entities that might not be properly escaped
-        if '&' in xml_content and not re.search(r'&(?:amp|lt|gt|quot|apos);', xml_content):
+        if '&' in xml_content and not _ESCAPED_ENTITY_RE.search(xml_content):
             warnings.append("Unescaped ampersand found - may cause parsing issues")
 
         # Check for inconsistent boolean format
-        bool_matches = re.findall(r'<recursive>(.*?)</recursive>', xml_content)
+        bool_matches = _RECURSIVE_VALUE_RE.findall(xml_content)
         for bool_value in bool_matches:
             if bool_value not in ['true', 'false']:
                 warnings.append(f"Non-standard boolean value: '{bool_value}'")
@@ -191,9 +205,9 @@ class FormatDriftDetector:
     def _normalize_xml(self, xml_content: str) -> str:
         """Normalize XML content for comparison."""
         # Remove whitespace variations and parameter values
-        normalized = re.sub(r'>\s+<', '><', xml_content.strip())
+        normalized = _INTER_TAG_WHITESPACE_RE.sub('><', xml_content.strip())
         # Replace parameter values with placeholders
-        normalized = re.sub(r'<(\w+)>.*?</\1>', r'<\1>{value}</\1>', normalized)
+        normalized = _ELEMENT_VALUE_RE.sub(r'<\1>{value}</\1>', normalized)
         return normalized
 
 
@@ -586,7 +586,7 @@ def parse_tool_calls(content: str) -> list:
     tool_calls = []
 
     for tool_name, tool_content in matches:
-        if tool_name in tool_registry.list_tools():
+        if tool_registry.get_tool(tool_name) is not None:
             # Validate XML format first
             validation_result = validate_xml_tool_call(f"<{tool_name}>{tool_content}</{tool_name}>")
 
@@ -881,7 +881,7 @@ async def handle_tool_result(session_id: str, message: Dict[str, Any]) -> Dict[s
 
         # Continue agentic loop until attempt_completion or no more tools
         # Safety limit to prevent infinite loops
-        recent_tool_count = sum(1 for msg in session.messages[-10:] if msg.role == "assistant" and msg.content and "Tool result:" in (msg.content or ""))
+        recent_tool_count = sum(1 for msg in session.get_recent_messages(10) if msg.role == "assistant" and msg.content and "Tool result:" in (msg.content or ""))
 
         if recent_tool_count < 10:  # Increased safety limit
             logger.info(f"🤖 Continuing agentic loop (tool #{recent_tool_count + 1})")
@@ -4,18 +4,26 @@ Handles conversation state and user sessions.
 """
 
 import asyncio
+import heapq
 import logging
+import secrets
 import time
-import uuid
-from typing import Dict, Optional, List, Any
+from collections import deque
+from itertools import islice
+from typing import Callable, Deque, Dict, Optional, List, Any, Tuple
 from dataclasses import dataclass, field
 
+from gambiarra.server._compat import DATACLASS_SLOTS
+
 logger = logging.getLogger(__name__)
 
+# Server-side ceiling on per-session history; clients may only ask for less
+MAX_HISTORY = 1000
 
-@dataclass
-class SessionMessage:
-    """A message in the conversation."""
+
+@dataclass(**DATACLASS_SLOTS)
+class _SessionMessageFields:
+    """Data fields of a SessionMessage."""
     role: str  # user, assistant, tool
     content: str
     timestamp: float = field(default_factory=time.time)
@@ -23,7 +31,22 @@ class SessionMessage:
     metadata: Dict[str, Any] = field(default_factory=dict)
 
 
-@dataclass
+class SessionMessage(_SessionMessageFields):
+    """A message in the conversation."""
+
+    # Kept outside the dataclass fields so asdict(), fields() and replace() don't see it
+    __slots__ = ("_cached_dict",)
+
+    def as_dict(self) -> Dict[str, str]:
+        """Get the message in OpenAI format, built once and reused (messages aren't mutated once added)."""
+        try:
+            return self._cached_dict
+        except AttributeError:
+            self._cached_dict: Dict[str, str] = {"role": self.role, "content": self.content}
+            return self._cached_dict
+
+
+@dataclass(**DATACLASS_SLOTS)
 class SessionConfig:
     """Configuration for a session."""
     working_directory: str = "."
@@ -31,6 +54,17 @@ class SessionConfig:
     operating_mode: str = "code"  # Default to full code mode
     require_approval_for_writes: bool = True
     max_concurrent_file_reads: int = 5
+    max_history: int = MAX_HISTORY  # Oldest messages are dropped beyond this
+
+
+def _parse_max_history(value: Any) -> int:
+    """Validate a client-requested history limit, clamped to MAX_HISTORY."""
+    if value is None:
+        return MAX_HISTORY
+    if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+        logger.warning(f"⚠️ Ignoring invalid max_history {value!r}, using {MAX_HISTORY}")
+        return MAX_HISTORY
+    return min(value, MAX_HISTORY)
 
 
 class Session:
@@ -41,10 +75,13 @@ class Session:
         self.connection_id = connection_id
         self.config = config
         self.created_at = time.time()
-        self.last_activity = time.time()
+
+        # Called when last_activity moves backwards, so expiry tracking can reschedule
+        self.on_activity_rewind: Optional[Callable[["Session"], None]] = None
+        self._last_activity = time.time()
 
         # Conversation state
-        self.messages: List[SessionMessage] = []
+        self.messages: Deque[SessionMessage] = deque(maxlen=config.max_history)
         self.pending_tools: Dict[str, Any] = {}
 
         # Context and memory
@@ -61,24 +98,23 @@ class Session:
         )
 
         self.messages.append(message)
-        self.last_activity = time.time()
+        self.update_activity()
 
         logger.debug(f"📝 Added {role} message to session {self.session_id}")
 
+    def get_recent_messages(self, count: int) -> List[SessionMessage]:
+        """Get the last `count` messages, oldest first (none if `count` is negative)."""
+        recent = list(islice(reversed(self.messages), max(count, 0)))
+        recent.reverse()
+        return recent
 
-    async def get_messages(self) -> List[Dict[str, str]]:
-        """Get conversation messages in OpenAI format."""
-        openai_messages = []
-
-        for msg in self.messages:
-            openai_msg = {
-                "role": msg.role,
-                "content": msg.content
-            }
+    async def get_messages(self, limit: Optional[int] = None) -> List[Dict[str, str]]:
+        """Get conversation messages in OpenAI format, optionally only the last `limit`.
 
-            openai_messages.append(openai_msg)
-
-        return openai_messages
+        The dicts are shared with the stored history; treat them as read-only.
+        """
+        messages = self.messages if limit is None else self.get_recent_messages(limit)
+        return [msg.as_dict() for msg in messages]
 
     async def get_context_summary(self) -> str:
         """Generate a summary of the current context."""
@@ -94,7 +130,7 @@ class Session:
             summary_parts.append(f"Context files: {', '.join(self.context_files)}")
 
         # Recent activity
-        recent_messages = self.messages[-3:] if len(self.messages) > 3 else self.messages
+        recent_messages = self.get_recent_messages(3)
         if recent_messages:
             summary_parts.append("Recent conversation:")
             for msg in recent_messages:
@@ -106,6 +142,18 @@ class Session:
         """Check if session has expired."""
         return (time.time() - self.last_activity) > timeout
 
+    @property
+    def last_activity(self) -> float:
+        """Timestamp of the most recent activity."""
+        return self._last_activity
+
+    @last_activity.setter
+    def last_activity(self, value: float) -> None:
+        rewound = value < self._last_activity
+        self._last_activity = value
+        if rewound and self.on_activity_rewind:
+            self.on_activity_rewind(self)
+
     def update_activity(self) -> None:
         """Update last activity timestamp."""
         self.last_activity = time.time()
@@ -120,17 +168,23 @@ class SessionManager:
         self._lock = asyncio.Lock()
         self._total_sessions = 0
 
+        # Min-heap of (last_activity, session_id). Entries are never updated in place:
+        # each live session has at least one entry no newer than its last activity,
+        # and stale entries are skipped or rescheduled when they reach the top.
+        self._expiry_heap: List[Tuple[float, str]] = []
+
     async def create_session(self, connection_id: str, config: Dict[str, Any]) -> str:
         """Create a new session."""
         async with self._lock:
-            session_id = str(uuid.uuid4())
+            session_id = secrets.token_hex(16)
 
             # Parse config
             session_config = SessionConfig(
                 working_directory=config.get("working_directory", "."),
                 auto_approve_reads=config.get("auto_approve_reads", True),
                 require_approval_for_writes=config.get("require_approval_for_writes", True),
-                max_concurrent_file_reads=config.get("max_concurrent_file_reads", 5)
+                max_concurrent_file_reads=config.get("max_concurrent_file_reads", 5),
+                max_history=_parse_max_history(config.get("max_history"))
             )
 
             # Create session
@@ -141,10 +195,18 @@ class SessionManager:
             self.connection_to_session[connection_id] = session_id
             self._total_sessions += 1
 
+            # Track expiry
+            session.on_activity_rewind = self._schedule_expiry
+            self._schedule_expiry(session)
+
             logger.info(f"🎯 Created session {session_id} for connection {connection_id}")
 
             return session_id
 
+    def _schedule_expiry(self, session: Session) -> None:
+        """Add an expiry heap entry for the session's current last activity."""
+        heapq.heappush(self._expiry_heap, (session.last_activity, session.session_id))
+
     def get_session(self, session_id: str) -> Optional[Session]:
         """Get session by ID."""
         session = self.sessions.get(session_id)
@@ -176,26 +238,33 @@ class SessionManager:
     async def cleanup_expired_sessions(self, timeout: int) -> int:
         """Clean up expired sessions."""
         async with self._lock:
-            expired_sessions = []
+            expired_count = 0
+            cutoff = time.time() - timeout
 
-            for session_id, session in self.sessions.items():
-                if session.is_expired(timeout):
-                    expired_sessions.append(session_id)
+            # Only sessions whose oldest heap entry predates the cutoff can be expired
+            while self._expiry_heap and self._expiry_heap[0][0] < cutoff:
+                _, session_id = heapq.heappop(self._expiry_heap)
+                session = self.sessions.get(session_id)
 
-            # Remove expired sessions
-            for session_id in expired_sessions:
-                session = self.sessions[session_id]
+                if session is None:
+                    continue  # Already removed
 
-                # Remove connection mapping
-                if session.connection_id in self.connection_to_session:
+                if session.last_activity >= cutoff:
+                    # Active since the entry was pushed; reschedule at its real activity time
+                    self._schedule_expiry(session)
+                    continue
+
+                # Remove connection mapping, unless the connection has since moved to a newer session
+                if self.connection_to_session.get(session.connection_id) == session_id:
                     del self.connection_to_session[session.connection_id]
 
                 # Remove session
                 del self.sessions[session_id]
+                expired_count += 1
 
                 logger.info(f"⏰ Expired session {session_id}")
 
-            return len(expired_sessions)
+            return expired_count
 
     async def cleanup_all(self) -> None:
         """Clean up all sessions."""
@@ -203,6 +272,7 @@ class SessionManager:
             session_count = len(self.sessions)
             self.sessions.clear()
             self.connection_to_session.clear()
+            self._expiry_heap.clear()
 
             logger.info(f"🧹 Cleaned up {session_count} sessions")
 
@@ -5,7 +5,7 @@ WebSocket connection management for Gambiarra server.
 import asyncio
 import json
 import logging
-from typing import Dict, Optional
+from typing import Dict, Iterable, Optional, Tuple
 from fastapi import WebSocket
 
 logger = logging.getLogger(__name__)
@@ -24,6 +24,13 @@ class WebSocketManager:
             self.connections[connection_id] = websocket
             logger.info(f"📡 Registered WebSocket connection: {connection_id}")
 
+    async def connect_many(self, connections: Iterable[Tuple[str, WebSocket]]) -> None:
+        """Register several WebSocket connections under a single lock acquisition."""
+        pairs = list(connections)
+        async with self._lock:
+            self.connections.update(pairs)
+            logger.info(f"📡 Registered {len(pairs)} WebSocket connections")
+
     async def disconnect(self, connection_id: str) -> None:
         """Remove a WebSocket connection."""
         async with self._lock:
@@ -37,12 +44,21 @@ class WebSocketManager:
             connections_to_close = list(self.connections.values())
             self.connections.clear()
 
-        # Close all connections
-        for websocket in connections_to_close:
-            try:
-                await websocket.close()
-            except Exception as e:
-                logger.error(f"❌ Error closing WebSocket: {e}")
+        # Close all connections concurrently; one failing close doesn't stop the rest
+        results = await asyncio.gather(
+            *(websocket.close() for websocket in connections_to_close),
+            return_exceptions=True
+        )
+        interrupt: Optional[BaseException] = None
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"❌ Error closing WebSocket: {result}")
+            elif isinstance(result, BaseException) and interrupt is None:
+                interrupt = result
+
+        # Cancellation and exits aren't close errors; re-raise once the rest are closed
+        if interrupt is not None:
+            raise interrupt
 
         logger.info(f"📡 Closed {len(connections_to_close)} WebSocket connections")
 
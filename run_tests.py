@@ -49,11 +49,16 @@ def main():
         action="store_true",
         help="Stop on first failure"
     )
+    parser.add_argument(
+        "--parallel",
+        action="store_true",
+        help="Spread tests across all CPUs (requires pytest-xdist)"
+    )
 
     args = parser.parse_args()
 
-    # Base pytest command
-    cmd = ["python", "-m", "pytest"]
+    # Base pytest command; one invocation collects every selected module, without the cache plugin's I/O
+    cmd = ["python", "-m", "pytest", "-p", "no:cacheprovider"]
 
     # Add test path based on category
     if args.category == "unit":
@@ -81,6 +86,9 @@ def main():
     if args.fail_fast:
         cmd.append("-x")
 
+    if args.parallel:
+        cmd.extend(["-n", "auto"])
+
     # Check if tests directory exists
     if not Path("tests").exists():
         print("❌ Tests directory not found. Run from project root.")
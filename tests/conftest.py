@@ -4,10 +4,9 @@ Shared test configuration and fixtures for Gambiarra test suite.
 
 import pytest
 import tempfile
-import asyncio
 from pathlib import Path
-from unittest.mock import AsyncMock, MagicMock, patch
-from typing import Dict, Any
+from types import MappingProxyType
+from unittest.mock import AsyncMock, MagicMock
 
 # Test data
 SAMPLE_WORKSPACE_FILES = {
@@ -129,10 +128,10 @@ def mock_session():
     return session
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def sample_tool_calls():
-    """Sample XML tool calls for testing."""
-    return SAMPLE_TOOL_CALLS
+    """Sample XML tool calls for testing (read-only, shared by the whole session)."""
+    return MappingProxyType(SAMPLE_TOOL_CALLS)
 
 
 @pytest.fixture
@@ -166,14 +165,6 @@ def mock_approval_manager():
     return manager
 
 
-@pytest.fixture(scope="session")
-def event_loop():
-    """Create an instance of the default event loop for the test session."""
-    loop = asyncio.get_event_loop_policy().new_event_loop()
-    yield loop
-    loop.close()
-
-
 # Test markers
 def pytest_configure(config):
     """Configure custom pytest markers."""
@@ -5,7 +5,7 @@ Tests the full client-server-AI workflow.
 
 import pytest
 import json
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock
 
 
 @pytest.mark.integration
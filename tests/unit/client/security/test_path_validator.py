@@ -241,7 +241,6 @@ class TestPathValidatorEdgeCases:
     def test_concurrent_validation(self, temp_workspace):
         """Test thread safety of path validation."""
         import threading
-        import time
 
         validator = PathValidator(temp_workspace)
         results = []
@@ -5,8 +5,6 @@ These tests ensure WebSocket messages are correctly parsed and validated.
 
 import pytest
 import json
-from typing import Dict, Any
-from gambiarra.server.core.tools.parser import ToolCallParser
 
 
 class TestMessageParsing:
@@ -6,16 +6,13 @@ Tests message flow, protocol compliance, and bidirectional communication.
 import pytest
 import asyncio
 import json
-from unittest.mock import AsyncMock, MagicMock, patch
+from unittest.mock import AsyncMock
 # Since these modules don't exist yet, we'll create mock implementations for testing
-from unittest.mock import MagicMock
 from dataclasses import dataclass
 from typing import Dict, Any, Optional, List
 from enum import Enum
 import time
 import uuid
-import json
-import asyncio
 
 # Mock implementations for testing
 class MessageType(Enum):
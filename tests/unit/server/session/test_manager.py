@@ -6,9 +6,9 @@ Tests session lifecycle, message handling, and state management.
 import pytest
 import asyncio
 import time
-from unittest.mock import AsyncMock, MagicMock
+from dataclasses import asdict, replace
 from gambiarra.server.session.manager import (
-    SessionManager, Session, SessionMessage, SessionConfig
+    MAX_HISTORY, SessionManager, Session, SessionMessage, SessionConfig
 )
 
 
@@ -61,6 +61,20 @@ class TestSessionMessage:
 
         assert before <= message.timestamp <= after
 
+    def test_session_message_cache_not_a_field(self):
+        """Test that the cached OpenAI dict stays out of the dataclass fields."""
+        message = SessionMessage(role="user", content="test", timestamp=1638360000.0)
+        message.as_dict()
+
+        assert asdict(message) == {
+            "role": "user",
+            "content": "test",
+            "timestamp": 1638360000.0,
+            "images": [],
+            "metadata": {},
+        }
+        assert replace(message, content="other").as_dict() == {"role": "user", "content": "other"}
+
 
 class TestSessionConfig:
     """Test SessionConfig data structure."""
@@ -95,7 +109,7 @@ class TestSessionConfig:
 class TestSession:
     """Test Session class functionality."""
 
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def session_config(self):
         """Create test session configuration."""
         return SessionConfig(
@@ -120,7 +134,7 @@ class TestSession:
         assert test_session.config == session_config
         assert isinstance(test_session.created_at, float)
         assert isinstance(test_session.last_activity, float)
-        assert test_session.messages == []
+        assert list(test_session.messages) == []
         assert test_session.pending_tools == {}
 
     @pytest.mark.asyncio
@@ -148,10 +162,10 @@ class TestSession:
         assert test_session.messages[0].role == "user"
         assert test_session.messages[0].content == "Hello"
 
-    def test_update_activity(self, test_session):
+    def test_update_activity(self, test_session, monkeypatch):
         """Test updating last activity timestamp."""
         original_time = test_session.last_activity
-        time.sleep(0.01)  # Small delay
+        monkeypatch.setattr("gambiarra.server.session.manager.time.time", lambda: original_time + 1.0)
         test_session.update_activity()
 
         assert test_session.last_activity > original_time
@@ -182,12 +196,53 @@ class TestSession:
             role = "user" if i % 2 == 0 else "assistant"
             await test_session.add_message(role, f"Message {i}")
 
-        # Get full history (limit functionality would need to be implemented)
         history = await test_session.get_messages()
         assert len(history) == 10
+
         # Should get the most recent messages
+        limited = await test_session.get_messages(limit=4)
+        assert [msg["content"] for msg in limited] == [f"Message {i}" for i in range(6, 10)]
         assert history[-1]["content"] == "Message 9"
 
+    @pytest.mark.asyncio
+    async def test_get_messages_reuses_message_dicts(self, test_session):
+        """Test that each message's OpenAI form is built once and reused."""
+        await test_session.add_message("user", "Hello")
+
+        first = await test_session.get_messages()
+        second = await test_session.get_messages()
+        assert first == [{"role": "user", "content": "Hello"}]
+        assert first[0] is second[0]
+
+    @pytest.mark.asyncio
+    async def test_history_bounded_by_max_history(self):
+        """Test that the oldest messages are dropped beyond max_history."""
+        session = Session("bounded", "conn-1", SessionConfig(max_history=3))
+
+        for i in range(5):
+            await session.add_message("user", f"Message {i}")
+
+        assert len(session.messages) == 3
+        assert session.messages[0].content == "Message 2"
+
+    @pytest.mark.asyncio
+    async def test_get_recent_messages(self, test_session):
+        """Test getting the most recent messages in order."""
+        for i in range(5):
+            await test_session.add_message("user", f"Message {i}")
+
+        recent = test_session.get_recent_messages(3)
+        assert [msg.content for msg in recent] == ["Message 2", "Message 3", "Message 4"]
+        assert len(test_session.get_recent_messages(10)) == 5
+
+    @pytest.mark.asyncio
+    async def test_negative_message_limit_returns_nothing(self, test_session):
+        """Test that a negative count or limit yields no messages instead of raising."""
+        await test_session.add_message("user", "Hello")
+
+        assert test_session.get_recent_messages(-1) == []
+        assert await test_session.get_messages(limit=-1) == []
+
     @pytest.mark.asyncio
     async def test_clear_conversation(self, test_session):
         """Test clearing conversation history."""
@@ -229,7 +284,7 @@ class TestSessionManager:
         """Create session manager instance."""
         return SessionManager()
 
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def session_config(self):
         """Create test session configuration."""
         return SessionConfig(working_directory="/test")
@@ -252,6 +307,23 @@ class TestSessionManager:
         assert session.connection_id == connection_id
         assert session_id in session_manager.sessions
 
+    @pytest.mark.parametrize("requested, expected", [
+        (10, 10),
+        (MAX_HISTORY + 1, MAX_HISTORY),
+        (None, MAX_HISTORY),
+        (0, MAX_HISTORY),
+        (-1, MAX_HISTORY),
+        ("10", MAX_HISTORY),
+        (True, MAX_HISTORY),
+    ])
+    async def test_create_session_max_history(self, session_manager, requested, expected):
+        """Test that client-supplied max_history is validated and clamped."""
+        session_id = await session_manager.create_session("conn-1", {"max_history": requested})
+
+        session = session_manager.sessions[session_id]
+        assert session.config.max_history == expected
+        assert session.messages.maxlen == expected
+
     async def test_get_session(self, session_manager, session_config):
         """Test getting an existing session."""
         connection_id = "conn-456"
@@ -334,6 +406,39 @@ class TestSessionManager:
         assert session.connection_id == connection_id
         assert session.session_id == session_id
 
+    async def test_cleanup_reschedules_recently_active_sessions(self, session_manager, monkeypatch):
+        """Test that a session active since its expiry entry was queued survives a sweep."""
+        now = [1000.0]
+        monkeypatch.setattr("gambiarra.server.session.manager.time.time", lambda: now[0])
+
+        # Created at t=1000, active again at t=5000
+        session_id = await session_manager.create_session("conn-1", {})
+        now[0] = 5000.0
+        session_manager.get_session(session_id)
+
+        # At t=6000 the creation entry is past the cutoff, but the session is not idle
+        now[0] = 6000.0
+        assert await session_manager.cleanup_expired_sessions(timeout=3600) == 0
+        assert session_id in session_manager.sessions
+
+        # At t=9000 it has been idle for over an hour
+        now[0] = 9000.0
+        assert await session_manager.cleanup_expired_sessions(timeout=3600) == 1
+        assert session_id not in session_manager.sessions
+
+    async def test_expired_session_keeps_newer_connection_mapping(self, session_manager):
+        """Test that expiring an old session doesn't unmap its connection's newer session."""
+        config_dict = {"working_directory": "/test"}
+
+        old_session_id = await session_manager.create_session("conn-1", config_dict)
+        new_session_id = await session_manager.create_session("conn-1", config_dict)
+        session_manager.sessions[old_session_id].last_activity = time.time() - 7200
+
+        expired_count = await session_manager.cleanup_expired_sessions(timeout=3600)
+
+        assert expired_count == 1
+        assert session_manager.get_session_by_connection("conn-1").session_id == new_session_id
+
     async def test_get_session_by_nonexistent_connection(self, session_manager):
         """Test getting session by non-existent connection."""
         session = session_manager.get_session_by_connection("nonexistent")
@@ -385,6 +490,18 @@ class TestSessionManager:
         assert len(session_manager.sessions) == 10
         assert all(isinstance(session_id, str) for session_id in sessions)
 
+    async def test_sessions_do_not_share_config(self, session_manager):
+        """Test that sessions created from the same config dict get independent configs."""
+        config_dict = {"working_directory": "/test"}
+
+        first_id = await session_manager.create_session("conn-1", config_dict)
+        second_id = await session_manager.create_session("conn-2", config_dict)
+
+        # Mode switches mutate the session's config in place
+        session_manager.get_session(first_id).config.operating_mode = "architect"
+
+        assert session_manager.get_session(second_id).config.operating_mode == "code"
+
     async def test_session_persistence_state(self, session_manager, session_config):
         """Test session state persistence during operations."""
         connection_id = "conn-123"
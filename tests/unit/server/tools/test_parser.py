@@ -3,9 +3,36 @@ Tests for server-side XML tool call parsing.
 These tests ensure consistent parsing and prevent injection attacks.
 """
 
+import json
 import pytest
 from gambiarra.server.core.tools.parser import ToolCallParser
 
+MALFORMED_XMLS = [
+    "<read_file><args><file><path>test.py</path></file>",  # Missing closing tags
+    "<read_file><args><file><path>test.py</path></args></read_file>",  # Missing </file>
+    "<read_file args><file><path>test.py</path></file></args></read_file>",  # Invalid syntax
+    "not xml at all",
+    "",
+    "<read_file></read_file>",  # Empty tool call
+]
+
+# (attack, entity reference that must not be expanded)
+INJECTION_ATTACKS = [
+    # XML entity expansion attack
+    ("""<?xml version="1.0"?>
+            <!DOCTYPE root [
+            <!ENTITY lol "lol">
+            ]>
+            <read_file><args><file><path>&lol;</path></file></args></read_file>""", "&lol;"),
+
+    # XXE attack
+    ("""<?xml version="1.0"?>
+            <!DOCTYPE root [
+            <!ENTITY xxe SYSTEM "file:///etc/passwd">
+            ]>
+            <read_file><args><file><path>&xxe;</path></file></args></read_file>""", "&xxe;"),
+]
+
 
 @pytest.mark.unit
 class TestXMLToolParser:
@@ -44,26 +71,17 @@ class TestXMLToolParser:
         assert params["path"] == "."
         assert params["recursive"] is True
 
-    def test_malformed_xml_handling(self):
+    @pytest.mark.parametrize("malformed_xml", MALFORMED_XMLS)
+    def test_malformed_xml_handling(self, malformed_xml):
         """Test handling of malformed XML."""
-        malformed_xmls = [
-            "<read_file><args><file><path>test.py</path></file>",  # Missing closing tags
-            "<read_file><args><file><path>test.py</path></args></read_file>",  # Missing </file>
-            "<read_file args><file><path>test.py</path></file></args></read_file>",  # Invalid syntax
-            "not xml at all",
-            "",
-            "<read_file></read_file>",  # Empty tool call
-        ]
-
-        for malformed_xml in malformed_xmls:
-            # Should either return empty dict or handle gracefully
-            try:
-                params = ToolCallParser.parse_xml_parameters(malformed_xml)
-                assert isinstance(params, dict)
-                # Empty results are acceptable for malformed input
-            except Exception as e:
-                # Exceptions are also acceptable - just shouldn't crash
-                assert isinstance(e, (ValueError, TypeError))
+        # Should either return empty dict or handle gracefully
+        try:
+            params = ToolCallParser.parse_xml_parameters(malformed_xml)
+            assert isinstance(params, dict)
+            # Empty results are acceptable for malformed input
+        except (ValueError, TypeError):
+            # Rejecting with a clear error is also acceptable - just shouldn't crash
+            pass
 
     def test_html_entity_unescaping(self):
         """Test proper unescaping of HTML entities."""
@@ -84,34 +102,27 @@ class TestXMLToolParser:
         assert "<script>" in params["content"]  # &lt; &gt; should be unescaped
         assert "alert('xss')" in params["content"]
 
-    def test_injection_attack_prevention(self):
-        """Test prevention of XML injection attacks."""
-        injection_attacks = [
-            # XML entity expansion attack
-            """<?xml version="1.0"?>
-            <!DOCTYPE root [
-            <!ENTITY lol "lol">
-            ]>
-            <read_file><args><file><path>&lol;</path></file></args></read_file>""",
+    def test_character_references_and_unknown_entities(self):
+        """Test that character references resolve and non-XML entities stay literal."""
+        xml_content = """<execute_command>
+<args>
+<command>echo &#65;&#x42; &quot;&apos; &nbsp; &#0;</command>
+</args>
+</execute_command>"""
 
-            # XXE attack
-            """<?xml version="1.0"?>
-            <!DOCTYPE root [
-            <!ENTITY xxe SYSTEM "file:///etc/passwd">
-            ]>
-            <read_file><args><file><path>&xxe;</path></file></args></read_file>""",
-        ]
+        params = ToolCallParser.parse_xml_parameters(xml_content)
 
-        for attack in injection_attacks:
-            try:
-                params = ToolCallParser.parse_xml_parameters(attack)
-                # If parsing succeeds, ensure no sensitive data leaked
-                if "path" in params:
-                    assert "passwd" not in params["path"].lower()
-                    assert "lol" not in params["path"].lower()
-            except Exception:
-                # Rejecting malicious XML is perfectly acceptable
-                pass
+        assert params["command"] == "echo AB \"' &nbsp; &#0;"
+
+    @pytest.mark.parametrize("attack,entity_ref", INJECTION_ATTACKS, ids=["entity_expansion", "xxe"])
+    def test_injection_attack_prevention(self, attack, entity_ref):
+        """Test prevention of XML injection attacks."""
+        params = ToolCallParser.parse_xml_parameters(attack)
+
+        # DTD-declared entities must never be expanded
+        path = params.get("path", entity_ref)
+        assert path == entity_ref
+        assert "passwd" not in path.lower()
 
     def test_large_xml_handling(self):
         """Test handling of unusually large XML inputs."""
@@ -210,6 +221,9 @@ class TestXMLToolParser:
             ("<read_file><args></args></read_file>", "read_file"),
             ("<write_to_file><args></args></write_to_file>", "write_to_file"),
             ("<execute_command><args></args></execute_command>", "execute_command"),
+            # Tool names mentioned inside the arguments don't override the root element
+            ("<attempt_completion><args><result>Ran <read_file> first</result></args></attempt_completion>",
+             "attempt_completion"),
             ("<invalid_tool><args></args></invalid_tool>", None),
             ("not xml", None),
             ("", None)
@@ -219,6 +233,17 @@ class TestXMLToolParser:
             extracted_type = ToolCallParser._extract_tool_type(xml)
             assert extracted_type == expected_type
 
+    def test_parse_returns_independent_dicts(self, sample_tool_calls):
+        """Test that each parse returns a fresh, JSON-serializable dict."""
+        xml_content = sample_tool_calls["read_file_nested"]
+
+        first = ToolCallParser.parse_xml_parameters(xml_content)
+        second = ToolCallParser.parse_xml_parameters(xml_content)
+        first["path"] = "changed.py"
+
+        assert second["path"] != "changed.py"
+        assert json.loads(json.dumps({"args": second})) == {"args": second}
+
     def test_parameter_type_conversion(self):
         """Test proper type conversion of parameters."""
         xml_with_types = """<write_to_file>
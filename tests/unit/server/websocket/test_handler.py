@@ -5,16 +5,46 @@ Tests connection management, message routing, and error handling.
 
 import pytest
 import asyncio
-from unittest.mock import AsyncMock, MagicMock, patch
+from gambiarra.server.websocket_handler import WebSocketManager
 
-# Mock FastAPI WebSocket before importing
-import sys
-sys.modules['fastapi'] = MagicMock()
 
-from gambiarra.server.websocket_handler import WebSocketManager
+class StubWebSocket:
+    """Minimal WebSocket stand-in recording sent messages and close calls."""
+
+    __slots__ = ("sent", "close_count")
+
+    def __init__(self):
+        self.sent = []
+        self.close_count = 0
+
+    async def send_text(self, message):
+        self.sent.append(message)
+
+    async def close(self):
+        self.close_count += 1
+
+
+class FailingCloseWebSocket(StubWebSocket):
+    """Stub WebSocket whose close() records the call and then fails."""
+
+    __slots__ = ()
+
+    async def close(self):
+        await super().close()
+        raise Exception("Close failed")
+
 
+class CancelledCloseWebSocket(StubWebSocket):
+    """Stub WebSocket whose close() records the call and then is cancelled."""
 
-@pytest.mark.asyncio
+    __slots__ = ()
+
+    async def close(self):
+        await super().close()
+        raise asyncio.CancelledError()
+
+
+@pytest.mark.asyncio(loop_scope="session")
 class TestWebSocketManager:
     """Test WebSocket connection management."""
 
@@ -25,12 +55,13 @@ class TestWebSocketManager:
 
     @pytest.fixture
     def mock_websocket(self):
-        """Create mock WebSocket instance."""
-        websocket = AsyncMock()
-        websocket.send_text = AsyncMock()
-        websocket.receive_text = AsyncMock()
-        websocket.close = AsyncMock()
-        return websocket
+        """Create stub WebSocket instance."""
+        return StubWebSocket()
+
+    @pytest.fixture(scope="session")
+    def ws_pool(self):
+        """Shared stub WebSockets for tests that only register them, never send or close."""
+        return tuple(StubWebSocket() for _ in range(32))
 
     async def test_connection_registration(self, ws_manager, mock_websocket):
         """Test WebSocket connection registration."""
@@ -69,16 +100,11 @@ class TestWebSocketManager:
         # Should not raise error
         await ws_manager.disconnect("nonexistent-connection")
 
-    async def test_concurrent_connections(self, ws_manager):
+    @pytest.mark.parametrize("count", [1, 10, 32])
+    async def test_concurrent_connections(self, ws_manager, ws_pool, count):
         """Test handling multiple concurrent connections."""
-        websockets = []
-        connection_ids = []
-
-        for i in range(10):
-            websocket = AsyncMock()
-            connection_id = f"connection-{i}"
-            websockets.append(websocket)
-            connection_ids.append(connection_id)
+        websockets = ws_pool[:count]
+        connection_ids = [f"connection-{i}" for i in range(count)]
 
         # Register all connections concurrently
         tasks = [
@@ -88,16 +114,27 @@ class TestWebSocketManager:
         await asyncio.gather(*tasks)
 
         # Verify all connections registered
+        assert len(ws_manager.connections) == count
+        for conn_id, ws in zip(connection_ids, websockets):
+            assert ws_manager.connections[conn_id] is ws
+
+    async def test_connect_many(self, ws_manager):
+        """Test registering a batch of connections at once."""
+        websockets = [StubWebSocket() for _ in range(10)]
+        connection_ids = [f"connection-{i}" for i in range(10)]
+
+        await ws_manager.connect_many(zip(connection_ids, websockets))
+
         assert len(ws_manager.connections) == 10
-        for conn_id in connection_ids:
-            assert conn_id in ws_manager.connections
+        for conn_id, websocket in zip(connection_ids, websockets):
+            assert ws_manager.get_websocket(conn_id) is websocket
 
     async def test_disconnect_all(self, ws_manager):
         """Test disconnecting all connections."""
         # Register multiple connections
         websockets = []
         for i in range(5):
-            websocket = AsyncMock()
+            websocket = StubWebSocket()
             connection_id = f"connection-{i}"
             await ws_manager.connect(connection_id, websocket)
             websockets.append(websocket)
@@ -112,15 +149,13 @@ class TestWebSocketManager:
 
         # Verify all websockets were closed
         for websocket in websockets:
-            websocket.close.assert_called_once()
+            assert websocket.close_count == 1
 
     async def test_disconnect_all_with_error(self, ws_manager):
         """Test disconnect_all handles individual close errors."""
         # Create websockets, some that will fail to close
-        failing_websocket = AsyncMock()
-        failing_websocket.close.side_effect = Exception("Close failed")
-
-        normal_websocket = AsyncMock()
+        failing_websocket = FailingCloseWebSocket()
+        normal_websocket = StubWebSocket()
 
         await ws_manager.connect("failing", failing_websocket)
         await ws_manager.connect("normal", normal_websocket)
@@ -129,25 +164,64 @@ class TestWebSocketManager:
         await ws_manager.disconnect_all()
 
         # Both should have close called
-        failing_websocket.close.assert_called_once()
-        normal_websocket.close.assert_called_once()
+        assert failing_websocket.close_count == 1
+        assert normal_websocket.close_count == 1
 
         # Connections should be cleared
         assert len(ws_manager.connections) == 0
 
+    async def test_disconnect_all_propagates_cancellation(self, ws_manager):
+        """Test disconnect_all re-raises a cancelled close after closing the rest."""
+        cancelled_websocket = CancelledCloseWebSocket()
+        failing_websocket = FailingCloseWebSocket()
+        normal_websocket = StubWebSocket()
+
+        await ws_manager.connect("cancelled", cancelled_websocket)
+        await ws_manager.connect("failing", failing_websocket)
+        await ws_manager.connect("normal", normal_websocket)
+
+        with pytest.raises(asyncio.CancelledError):
+            await ws_manager.disconnect_all()
+
+        assert cancelled_websocket.close_count == 1
+        assert failing_websocket.close_count == 1
+        assert normal_websocket.close_count == 1
+        assert len(ws_manager.connections) == 0
+
+    async def test_disconnect_all_closes_concurrently(self, ws_manager):
+        """Test that disconnect_all closes connections concurrently rather than one by one."""
+        active = 0
+        peak = 0
+
+        class ProbeWebSocket(StubWebSocket):
+            __slots__ = ()
+
+            async def close(self):
+                nonlocal active, peak
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0)
+                active -= 1
+
+        await ws_manager.connect_many((f"connection-{i}", ProbeWebSocket()) for i in range(3))
+        await ws_manager.disconnect_all()
+
+        assert peak == 3
+        assert len(ws_manager.connections) == 0
+
     async def test_thread_safety(self, ws_manager):
         """Test thread safety of connection operations."""
         # Simulate concurrent connects and disconnects
         async def connect_disconnect_cycle(i):
-            websocket = AsyncMock()
+            websocket = StubWebSocket()
             connection_id = f"connection-{i}"
 
             await ws_manager.connect(connection_id, websocket)
-            await asyncio.sleep(0.01)  # Small delay
+            await asyncio.sleep(0)  # Yield so the other cycles interleave with this one
             await ws_manager.disconnect(connection_id)
 
         # Run multiple cycles concurrently
-        tasks = [connect_disconnect_cycle(i) for i in range(20)]
+        tasks = [connect_disconnect_cycle(i) for i in range(200)]
         await asyncio.gather(*tasks)
 
         # Should end up with no connections
@@ -155,8 +229,8 @@ class TestWebSocketManager:
 
     async def test_connection_id_uniqueness(self, ws_manager):
         """Test that connection IDs must be unique."""
-        websocket1 = AsyncMock()
-        websocket2 = AsyncMock()
+        websocket1 = StubWebSocket()
+        websocket2 = StubWebSocket()
         connection_id = "same-id"
 
         # First connection
@@ -167,42 +241,31 @@ class TestWebSocketManager:
         await ws_manager.connect(connection_id, websocket2)
         assert ws_manager.connections[connection_id] == websocket2
 
-    async def test_get_all_connections(self, ws_manager):
+    async def test_get_all_connections(self, ws_manager, ws_pool):
         """Test getting all active connections."""
         # Register multiple connections
-        for i in range(3):
-            websocket = AsyncMock()
-            connection_id = f"connection-{i}"
-            await ws_manager.connect(connection_id, websocket)
+        for i, websocket in enumerate(ws_pool[:3]):
+            await ws_manager.connect(f"connection-{i}", websocket)
 
         # Check we can get all connections
         all_connections = ws_manager.connections
         assert len(all_connections) == 3
-        assert all(isinstance(ws, AsyncMock) for ws in all_connections.values())
+        assert all(isinstance(ws, StubWebSocket) for ws in all_connections.values())
 
     async def test_memory_cleanup(self, ws_manager):
         """Test that disconnected connections are properly cleaned up."""
-        import gc
-        import weakref
-
-        websocket = AsyncMock()
+        websocket = StubWebSocket()
         connection_id = "test-connection"
 
-        # Create weak reference to track garbage collection
-        weak_ref = weakref.ref(websocket)
-
         await ws_manager.connect(connection_id, websocket)
-        assert weak_ref() is not None
-
         await ws_manager.disconnect(connection_id)
-        del websocket
-        gc.collect()
 
-        # WebSocket should be eligible for garbage collection
-        # Note: This test might be flaky depending on Python's GC behavior
+        # The manager must not keep the socket alive after disconnect
+        assert connection_id not in ws_manager.connections
+        assert websocket not in ws_manager.connections.values()
 
 
-@pytest.mark.asyncio
+@pytest.mark.asyncio(loop_scope="session")
 class TestWebSocketMessageRouting:
     """Test WebSocket message routing functionality."""
 
@@ -212,9 +275,7 @@ class TestWebSocketMessageRouting:
 
     @pytest.fixture
     def mock_websocket(self):
-        websocket = AsyncMock()
-        websocket.send_text = AsyncMock()
-        return websocket
+        return StubWebSocket()
 
     async def test_send_message_to_connection(self, ws_manager, mock_websocket):
         """Test sending message to specific connection."""
@@ -229,14 +290,14 @@ class TestWebSocketMessageRouting:
         test_message = '{"type": "test", "data": "hello"}'
         await websocket.send_text(test_message)
 
-        mock_websocket.send_text.assert_called_once_with(test_message)
+        assert mock_websocket.sent == [test_message]
 
     async def test_broadcast_message(self, ws_manager):
         """Test broadcasting message to all connections."""
         # Register multiple connections
         websockets = []
         for i in range(3):
-            websocket = AsyncMock()
+            websocket = StubWebSocket()
             connection_id = f"connection-{i}"
             await ws_manager.connect(connection_id, websocket)
             websockets.append(websocket)
@@ -249,7 +310,7 @@ class TestWebSocketMessageRouting:
 
         # Verify all websockets received the message
         for websocket in websockets:
-            websocket.send_text.assert_called_once_with(test_message)
+            assert websocket.sent == [test_message]
 
     async def test_send_to_nonexistent_connection(self, ws_manager):
         """Test sending message to non-existent connection."""